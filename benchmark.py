@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+"""
+Compares the runtime profiles (see RUNTIME_PROFILE)
+
+Offline it measures the parts the profiles change with a synthetic member chunk payload,
+with --live it measures the time from start to ready against discord for each profile.
+The live mode uses a plain client without cogs, it needs TOKEN and doesn't send anything.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+
+PROFILES = ("default", "performance")
+
+
+def make_member_chunk(members: int) -> bytes:
+    """ Build a payload that looks like a GUILD_MEMBERS_CHUNK dispatch """
+    member = {
+        "user": {"id": "0", "username": "member", "global_name": "Member", "avatar": None, "discriminator": "0"},
+        "roles": ["760434164146634752", "1015975563250372698"],
+        "joined_at": "2022-09-01T12:00:00.000000+00:00",
+        "pending": False, "deaf": False, "mute": False, "flags": 0,
+    }
+    data = [dict(member, user=dict(member["user"], id=str(10 ** 17 + i))) for i in range(members)]
+    return json.dumps({"op": 0, "t": "GUILD_MEMBERS_CHUNK", "s": 1,
+                       "d": {"guild_id": "760421261649248296", "members": data,
+                             "chunk_index": 0, "chunk_count": 1}}).encode()
+
+
+def time_it(func, repeat: int) -> float:
+    """ Best average time of a function in ms """
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+async def switch_tasks(amount: int):
+    """ Schedule many small tasks, like the dispatch of a member chunk does """
+    await asyncio.gather(*(asyncio.sleep(0) for _ in range(amount)))
+
+
+def offline(members: int):
+    payload = make_member_chunk(members)
+    compressed = zlib.compress(payload)
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+        print("orjson not installed - 'performance' falls back to json")
+
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+        print("uvloop not installed - 'performance' falls back to asyncio")
+
+    print(f"Member chunk with {members} members, {len(payload) // 1024} KiB, "
+          f"{len(compressed) // 1024} KiB compressed\n")
+
+    print(f"zlib decompress:   {time_it(lambda: zlib.decompress(compressed), 20):8.2f} ms (same for both profiles)")
+    loads = {"default": json.loads, "performance": orjson.loads if orjson else json.loads}
+    loops = {"default": asyncio.new_event_loop,
+             "performance": uvloop.new_event_loop if uvloop else asyncio.new_event_loop}
+
+    for profile in PROFILES:
+        parse = time_it(lambda: loads[profile](payload), 20)
+
+        loop = loops[profile]()
+        schedule = time_it(lambda: loop.run_until_complete(switch_tasks(members)), 5)
+        loop.close()
+
+        print(f"{profile:<12} json parse: {parse:8.2f} ms   schedule {members} tasks: {schedule:8.2f} ms")
+
+
+# same event loop setup as runtime.apply_profile(), inlined because importing the bot package needs its whole config
+# the token is passed through the environment, so that it doesn't show up in the process list
+LIVE_CLIENT = """
+import asyncio, os, time
+import discord
+if os.environ["RUNTIME_PROFILE"] == "performance":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+start = time.perf_counter()
+client = discord.Client(intents=discord.Intents.all())
+
+@client.event
+async def on_ready():
+    print(time.perf_counter() - start)
+    await client.close()
+
+client.run(os.environ["TOKEN"], log_handler=None)
+"""
+
+
+def live(rounds: int):
+    if not os.getenv("TOKEN"):
+        sys.exit("--live needs TOKEN")
+
+    for profile in PROFILES:
+        results = []
+        for _ in range(rounds):
+            env = dict(os.environ, RUNTIME_PROFILE=profile)
+            out = subprocess.run([sys.executable, "-c", LIVE_CLIENT],
+                                 env=env, capture_output=True, text=True, check=True)
+            results.append(float(out.stdout.strip().splitlines()[-1]))
+        print(f"{profile:<12} start to ready: best {min(results):.2f}s, "
+              f"mean {sum(results) / len(results):.2f}s over {rounds} rounds")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=1000, help="members per chunk (discord sends up to 1000)")
+    parser.add_argument("--live", action="store_true", help="measure start to ready against discord")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds per profile in live mode")
+    args = parser.parse_args()
+
+    if args.live:
+        live(args.rounds)
+    else:
+        offline(args.members)
@@ -35,6 +35,11 @@ setup(
 
     install_requires=dependencies,
 
+    # used by RUNTIME_PROFILE=performance
+    extras_require={
+        'speed': ['discord.py[speed]', 'uvloop; sys_platform != "win32"'],
+    },
+
     classifiers=[
 
         'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from ..environment import GUILD, BULK_JOB_FILE, BULK_CHUNK_SIZE, BULK_CHUNK_DELAY
+from ..log_setup import logger
+from ..utils import runtime
+from ..utils import utils as ut
+from .buttons import diff_option_roles, OnboardingButtons
+
+### @package bulk_jobs
+#
+# Owner-only bulk jobs to migrate members between roles and to re-send the onboarding.
+# A job is planned once, then applied in chunks. A checkpoint is written after each chunk,
+# so that a job is resumed after a crash or restart.
+#
+
+
+class BulkJob:
+    """
+    Plan of a bulk job - a list of member ids and a cursor marking how many of them are done
+    """
+
+    def __init__(self, kind: str, params: dict, members: list[int],
+                 cursor: int = 0, failed: list[int] = None, created_at: str = None):
+        self.kind = kind
+        self.params = params
+        self.members = members
+        self.cursor = cursor
+        self.failed = failed if failed is not None else []
+        self.created_at = created_at if created_at is not None else datetime.now().isoformat(timespec="seconds")
+
+    @property
+    def finished(self) -> bool:
+        return self.cursor >= len(self.members)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "params": self.params,
+            "members": self.members,
+            "cursor": self.cursor,
+            "failed": self.failed,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BulkJob":
+        return cls(data["kind"], data["params"], data["members"],
+                   cursor=data.get("cursor", 0), failed=data.get("failed"), created_at=data.get("created_at"))
+
+
+def load_checkpoint(path=BULK_JOB_FILE) -> Optional[BulkJob]:
+    """!
+    Load the checkpoint of the last job
+
+    @return job if the checkpoint exists and is readable, else None
+    """
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        return BulkJob.from_dict(runtime.load_json(path))
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Can't read bulk job checkpoint '{path}': {e.__repr__()}")
+        return None
+
+
+def write_checkpoint(job: BulkJob, path=BULK_JOB_FILE):
+    """ Write the checkpoint to a temporary file first, so that a crash can't leave a half written checkpoint """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def remove_checkpoint(path=BULK_JOB_FILE):
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+class BulkJobs(commands.Cog):
+    """
+    Owner-only bulk role migration and re-onboarding
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.guild: discord.Guild = bot.get_guild(GUILD)
+        self.job: Optional[BulkJob] = load_checkpoint()
+        self.runner: Optional[asyncio.Task] = None
+        self.stopping = asyncio.Event()  # set to let the runner stop after the current member
+
+        # used to estimate the remaining time of the current run
+        self.run_started: Optional[float] = None
+        self.run_processed = 0
+
+    async def cog_load(self):
+        """ Resume a job that was interrupted by a crash or a restart """
+        if self.job and not self.job.finished:
+            logger.info(f"Resuming bulk job '{self.job.kind}' at {self.job.cursor}/{len(self.job.members)}")
+            self.start_runner()
+
+    async def cog_unload(self):
+        if self.runner:
+            self.runner.cancel()
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        return await ut.is_bot_owner(ctx)
+
+    def start_runner(self):
+        self.stopping.clear()
+        self.run_started = time.monotonic()
+        self.run_processed = 0
+        self.runner = asyncio.create_task(self.run_job())
+        self.runner.add_done_callback(self.on_runner_done)
+
+    @staticmethod
+    def on_runner_done(runner: asyncio.Task):
+        """ Log errors of the runner, they would be swallowed by the task otherwise """
+        if not runner.cancelled() and runner.exception() is not None:
+            logger.error("Bulk job runner failed", exc_info=runner.exception())
+
+    async def stop_runner(self):
+        """!
+        Let the runner stop after the current member and wait until it stopped
+        Cancelling could interrupt a member halfway, which is applied again on resume
+        """
+        if self.is_running():
+            self.stopping.set()
+            await asyncio.gather(self.runner, return_exceptions=True)
+
+    def is_running(self) -> bool:
+        return self.runner is not None and not self.runner.done()
+
+    def get_status(self) -> str:
+        """ Progress of the current job including an estimation of the remaining time """
+        if self.job is None:
+            return "No bulk job planned."
+
+        job = self.job
+        total = len(job.members)
+        percentage = round(job.cursor / total * 100) if total else 100
+        status = (f"Job `{job.kind}` {job.params} created at {job.created_at}\n"
+                  f"Progress: {job.cursor}/{total} ({percentage}%), {len(job.failed)} failed\n")
+
+        if job.finished:
+            return status + "State: finished"
+        if not self.is_running():
+            return status + "State: paused"
+
+        # time per member measured since the job was (re)started
+        if self.run_processed:
+            per_member = (time.monotonic() - self.run_started) / self.run_processed
+            eta = round(per_member * (total - job.cursor) / 60, 1)
+            return status + f"State: running, ETA ~{eta} min"
+        return status + "State: running, ETA unknown"
+
+    async def run_job(self):
+        """ Apply the job in chunks, write a checkpoint after each chunk and wait to keep the rate low """
+        job = self.job
+        while not job.finished:
+            # e.g. a role was deleted while the job runs, pause instead of failing every member
+            missing = self.get_missing_requirement()
+            if missing:
+                logger.error(f"Bulk job '{job.kind}' paused: {missing}")
+                await asyncio.to_thread(write_checkpoint, job)
+                return
+
+            chunk = job.members[job.cursor:job.cursor + BULK_CHUNK_SIZE]
+            for member_id in chunk:
+                # stop on shutdown or pause, the checkpoint below lets the next start continue here
+                if not self.bot.lifecycle.accepting or self.stopping.is_set():
+                    break
+
+                try:
+                    with self.bot.lifecycle.track("bulk", member_id=member_id):
+                        await self.apply(member_id)
+                except discord.HTTPException as e:
+                    logger.warning(f"Bulk job '{job.kind}' failed for {member_id}: {e.__repr__()}")
+                    job.failed.append(member_id)
+                except Exception as e:
+                    logger.error(f"Bulk job '{job.kind}' failed for {member_id}", exc_info=e)
+                    job.failed.append(member_id)
+                # advance per member, so that pausing doesn't apply a member twice
+                job.cursor += 1
+                self.run_processed += 1
+
+            await asyncio.to_thread(write_checkpoint, job)
+            logger.info(f"Bulk job '{job.kind}': {job.cursor}/{len(job.members)} done")
+
+            if not self.bot.lifecycle.accepting:
+                logger.info(f"Bulk job '{job.kind}' stopped due to shutdown")
+                return
+
+            if self.stopping.is_set():
+                logger.info(f"Bulk job '{job.kind}' stopped")
+                return
+
+            # a pause doesn't have to wait for the whole delay
+            if not job.finished:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), BULK_CHUNK_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+
+        logger.info(f"Bulk job '{job.kind}' finished, {len(job.failed)} members failed")
+
+    def get_missing_requirement(self) -> Optional[str]:
+        """!
+        Check that everything the current job needs still exists
+
+        @return description of what is missing, None if the job can be applied
+        """
+        if self.job.kind == "migrate":
+            for param in ("old_role", "new_role"):
+                if self.bot.resolver.role(self.job.params[param]) is None:
+                    return f"{param} {self.job.params[param]} doesn't exist anymore"
+
+
+        return None
+
+    async def apply(self, member_id: int):
+        """ Apply the current job to a single member, members that left the guild are skipped """
+        member = self.guild.get_member(member_id)
+        if member is None:
+            return
+
+        if self.job.kind == "migrate":
+            old_role = self.bot.resolver.role(self.job.params["old_role"])
+            new_role = self.bot.resolver.role(self.job.params["new_role"])
+            available_roles = {old_role, new_role}
+            # keep the selection as it is, just swap the old role against the new one
+            selected_roles = set(member.roles).intersection(available_roles)
+            selected_roles.discard(old_role)
+            selected_roles.add(new_role)
+
+            to_give, to_remove = diff_option_roles(member.roles, available_roles, selected_roles)
+            await member.add_roles(*to_give, reason="Bulk role migration")
+            await member.remove_roles(*to_remove, reason="Bulk role migration")
+
+        # like update_base_roles - members keep their roles and access, they just get the buttons again
+        elif self.job.kind == "reonboard":
+            await member.send(self.bot.templates.render("onboarding", str(self.guild.preferred_locale)),
+                              view=OnboardingButtons(self.bot))
+
+    async def plan(self, ctx: commands.Context, kind: str, params: dict, members: list[discord.Member]):
+        """ Store a new plan and start applying it """
+        if self.job and not self.job.finished:
+            await ctx.send(f"There is an unfinished job, use `{ctx.prefix}bulk cancel` first.\n{self.get_status()}")
+            return
+
+        self.job = BulkJob(kind, params, [member.id for member in members])
+        await asyncio.to_thread(write_checkpoint, self.job)
+        logger.info(f"Planned bulk job '{kind}' {params} for {len(self.job.members)} members")
+
+        self.start_runner()
+        await ctx.send(f"Planned job for {len(self.job.members)} members, "
+                       f"{BULK_CHUNK_SIZE} members every {BULK_CHUNK_DELAY}s.")
+
+    @commands.group(name="bulk", invoke_without_command=True, help="Show state of the bulk job")
+    async def bulk(self, ctx: commands.Context):
+        await ctx.send(self.get_status())
+
+    @bulk.command(name="migrate", help="Move all members from one role to another")
+    async def migrate(self, ctx: commands.Context, old_role: discord.Role, new_role: discord.Role):
+        await self.plan(ctx, "migrate", {"old_role": old_role.id, "new_role": new_role.id}, old_role.members)
+
+    @bulk.command(name="reonboard", help="Re-send the onboarding to all members of a role")
+    async def reonboard(self, ctx: commands.Context, role: discord.Role):
+        await self.plan(ctx, "reonboard", {"role": role.id}, role.members)
+
+    @bulk.command(name="pause", help="Pause the bulk job, resume continues at the checkpoint")
+    async def pause(self, ctx: commands.Context):
+        if self.is_running():
+            await self.stop_runner()
+            await asyncio.to_thread(write_checkpoint, self.job)
+        await ctx.send(self.get_status())
+
+    @bulk.command(name="resume", help="Resume a paused bulk job")
+    async def resume(self, ctx: commands.Context):
+        if self.job and not self.job.finished and not self.is_running():
+            self.start_runner()
+        await ctx.send(self.get_status())
+
+    @bulk.command(name="cancel", help="Cancel the bulk job and delete its checkpoint")
+    async def cancel(self, ctx: commands.Context):
+        await self.stop_runner()
+        self.job = None
+        await asyncio.to_thread(remove_checkpoint)
+        await ctx.send("Bulk job cancelled.")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(BulkJobs(bot))
@@ -1,13 +1,33 @@
-import json
-from typing import Union
+from typing import Iterable, Union
 
 import discord
 import discord.errors as discord_errors
 from discord.ext import commands
 
-from ..environment import GUILD, ROLES, ONBOARDING_ROLE, START_CHANNEL, ROLE_OPTION_FILE, EXTRA_INFO
+from ..environment import GUILD, ONBOARDING_ROLE
 from ..log_setup import logger
 
+
+def diff_option_roles(member_roles: Iterable[discord.Role],
+                      available_roles: Iterable[discord.Role],
+                      selected_roles: Iterable[discord.Role]) -> tuple[set[discord.Role], set[discord.Role]]:
+    """
+    Calculate which roles a member needs to gain and to lose so that the member ends up with the selection.
+    Roles that are not part of available_roles aren't touched, default roles can be added to the selection.
+
+    @return (roles to give, roles to remove)
+    """
+    # all roles from that menu the user has at the moment (roles not given trough that menu removed via intersect)
+    member_roles_set = set(member_roles).intersection(available_roles)
+    selected_roles_set = set(selected_roles)
+
+    # roles member selected but does not have yet
+    to_give = selected_roles_set.difference(member_roles_set)
+    # roles member has but does not want
+    to_remove = member_roles_set.difference(selected_roles_set)
+    return to_give, to_remove
+
+
 """
 Used to start a new dialogue on the server
 """
@@ -60,16 +80,16 @@ class SelectionButton(discord.ui.Button["Onboarding"]):
 
 class CommitButton(discord.ui.Button["Onboarding"]):
     """ Button used to call the function that gives the roles """
-    def __init__(self, label: str, default_roles: list[int] = None):
+    def __init__(self, label: str, give_default_roles: bool = False):
         super().__init__()
 
         self.label = label
         self.style = discord.ButtonStyle.danger
-        self.default_roles = default_roles
+        self.give_default_roles = give_default_roles
 
     async def callback(self, interaction: discord.Interaction):
 
-        await self.view.commit_selection(interaction, default_roles=self.default_roles)
+        await self.view.commit_selection(interaction, give_default_roles=self.give_default_roles)
 
 
 class OnboardingButtons(discord.ui.View):
@@ -82,11 +102,7 @@ class OnboardingButtons(discord.ui.View):
         self.buttons: list[Union[SelectionButton, CommitButton]] = []
 
         # buttons will be generated from that
-        with open(ROLE_OPTION_FILE, "r") as f:
-            button_option_dict: dict = json.load(f)
-            # we can assume that there is only one key since this bot is currently single server
-            guild_key = list(button_option_dict.keys())[0]  # TODO: come up with a better solution
-            self.button_option_dict = button_option_dict[guild_key]["role_buttons"]
+        self.button_option_dict = bot.resolver.role_options
 
         # generate buttons
         for k, v in self.button_option_dict.items():
@@ -95,19 +111,20 @@ class OnboardingButtons(discord.ui.View):
             self.add_item(button)
 
         # add commit button, it's the last in the row
-        commit_button = CommitButton("Bestätigen", default_roles=ROLES)
+        commit_button = CommitButton("Bestätigen", give_default_roles=True)
         self.buttons.append(commit_button)
         self.add_item(commit_button)
 
-    async def commit_selection(self, interaction: discord.Interaction, default_roles: list[int] = None):
+    async def commit_selection(self, interaction: discord.Interaction, give_default_roles: bool = False):
         """ Function walking all buttons, giving roles and removing the onboarding role"""
         guild = self.bot.get_guild(GUILD)
+        resolver = self.bot.resolver
         member = guild.get_member(interaction.user.id)
 
         # member is not on guild
         if member is None:
             await interaction.response.edit_message(
-                content="Du bist nicht mehr auf dem Server.",
+                content=self.bot.templates.render("left", str(interaction.locale)),
                 view=None  # remove buttons
             )
             return
@@ -116,43 +133,23 @@ class OnboardingButtons(discord.ui.View):
         # so we better just acknowledge it straight ahead and send a followup when the roles are done
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        # generate list of roles to give
-        available_roles = [guild.get_role(button.role_id)
-                           for button in self.buttons
-                           if isinstance(button, SelectionButton)]
+        # generate set of roles to give, roles that don't exist anymore are left out by the resolver
+        selected_roles = resolver.resolve_roles(button.role_id
+                                                for button in self.buttons
+                                                if isinstance(button, SelectionButton)
+                                                and button.style == discord.ButtonStyle.green)
 
-        selected_roles = [guild.get_role(button.role_id)
-                          for button in self.buttons
-                          if isinstance(button, SelectionButton) and button.style == discord.ButtonStyle.green]
+        # bot is shutting down, new commits are saved for the next start
+        # commits that were submitted before are still applied while the shutdown drains them
+        if not self.bot.lifecycle.accepting:
+            template = await self.apply_selection(member.id, selected_roles, give_default_roles, defer=True)
 
-        # add default roles to the mix and remove onboarding role if user is new
-        onboarding_role = guild.get_role(ONBOARDING_ROLE)  # role that member only has during onboarding
-        if default_roles and onboarding_role in member.roles:
-            selected_roles.extend(guild.get_role(role) for role in default_roles)
-            update_message = (f"Du bist nun freigeschaltet\n"
-                              f"Schau doch mal in {guild.get_channel(START_CHANNEL).mention} vorbei :)\n"
-                              f"{EXTRA_INFO}")
-            reason = "First time onboarding"
-            # remove onboarding
-            await member.remove_roles(onboarding_role, reason=reason)
-
-        # member was already here before
+        # clicks of one member are applied one after another, a newer selection replaces a queued one
+        # and a selection equal to the one in-flight shares its role edit
         else:
-            update_message = f"Deine Rollen wurden aktualisiert.\nViel Spaß weiterhin!"
-            reason = "Role Update via buttons"
-
-        # add roles
-        # all roles from that menu the user has at the moment (roles not given trough that menu removed via intersect)
-        member_roles_set = set(member.roles).intersection(available_roles)
-        selected_roles_set = set(selected_roles)
-
-        # roles member selected but does not have yet
-        to_give = selected_roles_set.difference(member_roles_set)
-        await member.add_roles(*to_give, reason=reason)
-
-        # roles member has but does not want
-        to_remove = member_roles_set.difference(selected_roles_set)
-        await member.remove_roles(*to_remove, reason="Onboarding finished")
+            template = await self.bot.commits.submit(member.id, (selected_roles, give_default_roles),
+                                                     lambda selection: self.apply_selection(member.id, *selection))
+        update_message = self.bot.templates.render(template, str(interaction.locale))
 
         # send message that we're done
         try:
@@ -165,3 +162,59 @@ class OnboardingButtons(discord.ui.View):
             await interaction.followup.send(
                 content=update_message,
                 ephemeral=True)
+
+    async def apply_selection(self, member_id: int, selected_roles: frozenset[discord.Role],
+                              give_default_roles: bool, defer: bool = False) -> str:
+        """!
+        Give the selected roles and remove the onboarding role if the member is new
+        The member is looked up when the commit is applied, so that earlier commits are taken into account
+
+        @param defer save the commit to be applied on the next start instead of applying it
+        @return name of the template to answer with
+        """
+        guild = self.bot.get_guild(GUILD)
+        resolver = self.bot.resolver
+        member = guild.get_member(member_id)
+        if member is None:
+            return "left"
+
+        # add default roles to the mix and remove onboarding role if user is new
+        onboarding_role = resolver.role(ONBOARDING_ROLE)  # role that member only has during onboarding
+        first_onboarding = give_default_roles and onboarding_role in member.roles
+        if first_onboarding:
+            selected_roles = selected_roles.union(resolver.default_roles)
+            template = "onboarded"
+            reason = "First time onboarding"
+
+        # member was already here before
+        else:
+            template = "roles_updated"
+            reason = "Role Update via buttons"
+
+        to_give, to_remove = diff_option_roles(member.roles, resolver.option_roles, selected_roles)
+        if first_onboarding:
+            to_remove.add(onboarding_role)
+
+        # the ids are stored, so that the commit can be replayed if the bot stops in between
+        action = {"member_id": member.id,
+                  "give": [role.id for role in to_give],
+                  "remove": [role.id for role in to_remove],
+                  "reason": reason}
+        lifecycle = self.bot.lifecycle
+
+        # bot is shutting down, the roles will be given on the next start
+        if defer:
+            lifecycle.defer("commit", **action)
+            return "restarting"
+
+        # only the difference is sent, so that roles given by others in the meantime aren't touched
+        # a burst of clicks was coalesced before, so this is at most one add and one remove call
+        with lifecycle.track("commit", **action):
+            if to_give:
+                await member.add_roles(*to_give, reason=reason)
+            if to_remove:
+                await member.remove_roles(*to_remove, reason=reason)
+
+        # e.g. stops the refresh of the onboarding message
+        self.bot.dispatch("selection_committed", member)
+        return template
@@ -0,0 +1,114 @@
+import asyncio
+import tracemalloc
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from ..log_setup import logger
+from ..utils import utils as ut
+
+### @package diagnostics
+#
+# Owner-only introspection of the running bot.
+# Shows view store and cache sizes, the state of the member check and tracemalloc allocation diffs,
+# to track down memory growth without attaching a debugger.
+#
+
+
+class Diagnostics(commands.Cog):
+    """
+    Owner-only memory and cache introspection
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.snapshot: Optional[tracemalloc.Snapshot] = None  # baseline for the next allocation diff
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        return await ut.is_bot_owner(ctx)
+
+    def get_view_stats(self) -> str:
+        """ Views tracked by discord.py's view store, read defensively since the store is private """
+        store = getattr(getattr(self.bot, "_connection", None), "_view_store", None)
+        if store is None:
+            return "View store not available"
+
+        # items waiting for interactions, keyed by message id (None for views not bound to a message)
+        tracked_views = {id(item.view) for items in getattr(store, "_views", {}).values() for item in items.values()}
+        message_views = len(getattr(store, "_synced_message_views", {}))
+        persistent_views = len(self.bot.persistent_views)
+
+        return (f"Views in store: {len(tracked_views)}\n"
+                f"Message bound views: {message_views}\n"
+                f"Persistent views: {persistent_views}")
+
+    def get_cache_stats(self) -> str:
+        guilds = self.bot.guilds
+        return (f"Guilds: {len(guilds)}\n"
+                f"Members: {sum(len(g.members) for g in guilds)}\n"
+                f"Roles: {sum(len(g.roles) for g in guilds)}\n"
+                f"Channels: {sum(len(g.channels) for g in guilds)}\n"
+                f"Users: {len(self.bot.users)}\n"
+                f"Messages: {len(self.bot.cached_messages)}")
+
+    def get_member_check_stats(self) -> str:
+        """ State of the periodic member check of the VerificationListener """
+        listener = self.bot.get_cog("VerificationListener")
+        if listener is None:
+            return "VerificationListener not loaded"
+
+        loop = listener.walk_members
+        next_iteration = discord.utils.format_dt(loop.next_iteration, "R") if loop.next_iteration else "-"
+        last_duration = f"{round(listener.last_walk_duration, 2)}s" if listener.last_walk_duration is not None else "-"
+        return (f"Running: {loop.is_running()}\n"
+                f"Iteration: {loop.current_loop}\n"
+                f"Next iteration: {next_iteration}\n"
+                f"Last duration: {last_duration}")
+
+    @commands.group(name="diag", invoke_without_command=True, help="Show view store, cache and member check state")
+    async def diag(self, ctx: commands.Context):
+        emb = discord.Embed(title="Diagnostics", color=ut.blue_light)
+        emb.add_field(name="Views", value=self.get_view_stats(), inline=False)
+        emb.add_field(name="Caches", value=self.get_cache_stats(), inline=False)
+        emb.add_field(name="Member check", value=self.get_member_check_stats(), inline=False)
+        emb.add_field(name="Event loop lag", value=self.bot.watchdog.format_percentiles(), inline=False)
+        await ut.send_embed(ctx, emb)
+
+    @diag.command(name="snapshot", help="Start tracing allocations and take a baseline snapshot")
+    async def snapshot(self, ctx: commands.Context):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            logger.info("Started tracemalloc")
+
+        self.snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+        await ctx.send(f"Took snapshot, traced memory: {tracemalloc.get_traced_memory()[0] // 1024} KiB")
+
+    @diag.command(name="memdiff", help="Show the top allocation changes since the last snapshot")
+    async def memdiff(self, ctx: commands.Context, top: int = 10):
+        """!
+        Compare a new snapshot with the last one, the new snapshot becomes the baseline for the next diff
+
+        @param ctx Context of the message
+        @param top amount of lines to show
+        """
+        if self.snapshot is None:
+            await ctx.send(f"No snapshot yet, use `{ctx.prefix}diag snapshot` first.")
+            return
+
+        new_snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+        stats = await asyncio.to_thread(new_snapshot.compare_to, self.snapshot, "lineno")
+        self.snapshot = new_snapshot
+
+        lines = [f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d}) {stat.traceback}" for stat in stats[:top]]
+        await ctx.send("```\n" + "\n".join(lines)[:1900] + "\n```")
+
+    @diag.command(name="stoptrace", help="Stop tracing allocations")
+    async def stoptrace(self, ctx: commands.Context):
+        tracemalloc.stop()
+        self.snapshot = None
+        await ctx.send("Stopped tracemalloc.")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Diagnostics(bot))
@@ -0,0 +1,126 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Iterator, Literal
+
+import discord
+from discord.ext import commands
+
+from ..environment import GUILD, ROLES, ONBOARDING_ROLE, EXPORT_DIR, EXPORT_CHUNK_SIZE
+from ..log_setup import logger
+from ..utils import utils as ut
+
+### @package export
+#
+# Owner-only export of the onboarding state and the selected option roles of all members.
+# The export is generated chunk by chunk from the member cache and appended to a file,
+# so neither the whole dataset is held in memory nor the event loop is blocked by writing it.
+#
+
+FIELDS = ("member_id", "joined_at", "onboarding_status", "option_roles")
+
+
+class Export(commands.Cog):
+    """
+    Owner-only export of onboarding and role selection data
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.guild: discord.Guild = bot.get_guild(GUILD)
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        return await ut.is_bot_owner(ctx)
+
+    def get_status(self, member: discord.Member, role_ids: set[int]) -> str:
+        """ Onboarding status of a member """
+        if member.pending:
+            return "pending"  # hasn't accepted the rules yet
+        if ONBOARDING_ROLE in role_ids:
+            return "onboarding"
+        if role_ids.intersection(ROLES):
+            return "onboarded"
+        return "none"
+
+    def generate_rows(self, option_roles: dict[int, str]) -> Iterator[dict]:
+        """!
+        Lazily generate one row per cached member
+
+        @param option_roles mapping of role id to button label of the role options
+        """
+        for member in self.guild.members:
+            role_ids = {role.id for role in member.roles}
+            yield {
+                "member_id": member.id,
+                "joined_at": member.joined_at.isoformat() if member.joined_at else "",
+                "onboarding_status": self.get_status(member, role_ids),
+                "option_roles": [label for role_id, label in option_roles.items() if role_id in role_ids],
+            }
+
+    @staticmethod
+    def render_chunk(rows: list[dict], file_format: str) -> str:
+        """ Render rows as csv (roles separated by ';') or as json lines """
+        if file_format == "jsonl":
+            return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+        for row in rows:
+            writer.writerow(dict(row, option_roles=";".join(row["option_roles"])))
+        return buffer.getvalue()
+
+    async def write_export(self, path: str, file_format: str) -> int:
+        """!
+        Write the export to path in chunks of EXPORT_CHUNK_SIZE members
+
+        @return amount of exported members
+        """
+        option_roles = {role_id: label for label, role_id in self.bot.resolver.role_options.items()}
+        rows = self.generate_rows(option_roles)
+        count = 0
+
+        f = await asyncio.to_thread(open, path, "w", encoding="utf-8", newline="")
+        try:
+            if file_format == "csv":
+                await asyncio.to_thread(f.write, ",".join(FIELDS) + "\r\n")
+
+            while True:
+                chunk = [row for _, row in zip(range(EXPORT_CHUNK_SIZE), rows)]
+                if not chunk:
+                    break
+
+                # writing in a thread also gives other tasks a chance to run between two chunks
+                await asyncio.to_thread(f.write, self.render_chunk(chunk, file_format))
+                count += len(chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+
+        return count
+
+    @commands.command(name="export", help="Export onboarding state and selected roles of all members")
+    async def export(self, ctx: commands.Context, file_format: Literal["csv", "jsonl"] = "csv"):
+        """!
+        Export member id, join date, onboarding status and selected option roles of all members
+
+        @param ctx Context of the message
+        @param file_format csv or jsonl
+        """
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"members-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{file_format}")
+
+        async with ctx.typing():
+            count = await self.write_export(path, file_format)
+        logger.info(f"Exported {count} members to '{path}'")
+
+        # attach if possible, otherwise the file stays on disk
+        if os.path.getsize(path) < self.guild.filesize_limit:
+            await ctx.send(f"Exported {count} members.", file=discord.File(path))
+        else:
+            await ctx.send(f"Exported {count} members, the file is too large to upload.\nSaved at: `{path}`")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Export(bot))
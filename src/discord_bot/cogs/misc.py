@@ -30,12 +30,14 @@ class Misc(commands.Cog):
 
         @param ctx Context of the message
         """
-        logger.info(f"ping: {round(self.bot.latency * 1000)}")
+        loop_lag = self.bot.watchdog.format_percentiles()
+        logger.info(f"ping: {round(self.bot.latency * 1000)}, loop lag: {loop_lag}")
 
         await ctx.send(
             embed=ut.make_embed(
                 name='Bot is available',
-                value=f'`{round(self.bot.latency * 1000)}ms`')
+                value=f'`{round(self.bot.latency * 1000)}ms`\n'
+                      f'Event loop lag: `{loop_lag}`')
         )
 
     # Example for an event listener
@@ -1,15 +1,26 @@
-from typing import Optional, Literal
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional, Literal
 
 import discord
 from discord.ext import commands
 from discord.ext import tasks
 from discord import app_commands
 
-from ..environment import ROLES, START_CHANNEL, GUILD, NOT_BEFORE, CHECK_PERIOD, ONBOARDING_CHANNEL, ONBOARDING_ROLE
+from ..environment import GUILD, NOT_BEFORE, CHECK_PERIOD, ONBOARDING_CHANNEL, ONBOARDING_ROLE
+from ..environment import ONBOARDING_REFRESH, ONBOARDING_REFRESH_LIMIT, SWEEP_API_RATE, SWEEP_BATCH_SIZE
 from ..log_setup import logger
+from ..utils import utils as ut
+from ..utils.reconcile import SweepPlan, plan_sweep, needs_onboarding, has_onboarding_role
+from ..utils.scheduler import DeadlineScheduler
 
 from .buttons import OnboardingButtons, EntryPointView
 
+# seconds the refresh waits after the buttons expired, so that their view has timed out for sure
+REFRESH_GRACE = 60
+
 
 class VerificationListener(commands.Cog):
     """
@@ -21,24 +32,141 @@ class VerificationListener(commands.Cog):
         self.bot = bot
         self.guild: discord.Guild = bot.get_guild(GUILD)
         print(self.guild)
-        self.roles = [self.guild.get_role(role) for role in ROLES]
         self.walk_members.start()  # start backup task
-        self.onboarding_channel = self.guild.get_channel(ONBOARDING_CHANNEL)
-        self.onboarding_role = self.guild.get_role(ONBOARDING_ROLE)
+        # holds the time the buttons of each sent onboarding message expire, keyed by member id
+        self.refresh_scheduler = DeadlineScheduler(self.refresh_onboarding)
+        # view of the onboarding message waiting for a refresh, tells whether its buttons still work
+        self.onboarding_views: dict[int, OnboardingButtons] = {}
+        # onboarding messages this run sent or tried to send per member, limits the refreshes
+        self.onboarding_messages: Counter = Counter()
+        self.last_walk_duration: Optional[float] = None  # seconds the last member check took
+
+    # roles and channels are resolved through the shared cache, so that they're never stale
+    @property
+    def onboarding_role(self) -> Optional[discord.Role]:
+        return self.bot.resolver.role(ONBOARDING_ROLE)
+
+    @property
+    def onboarding_channel(self) -> Optional[discord.TextChannel]:
+        return self.bot.resolver.channel(ONBOARDING_CHANNEL)
 
     async def cog_load(self):
         """
+        Checks that the configured roles and channels exist
         Sends a new start button every time, to ensure that the current button is functional
+        Replays actions that were left over by the last shutdown
         """
+        self.bot.resolver.verify()
+        self.refresh_scheduler.start()
+        await self.replay_pending()
         await self.onboarding_channel.purge()
-        await self.onboarding_channel.send("Klick auf den Button und wähle die Optionen, die auf dich zutreffen.\n"
-                                           "Bei Problemen wende dich bitte an die Serverleitung :)",
+        await self.onboarding_channel.send(self.bot.templates.render("entry_point", str(self.guild.preferred_locale)),
                                            view=EntryPointView(self.bot, "Freischalten"))
 
-    async def send_onboarding_message(self, member: discord.Member) -> discord.Message:
-        return await member.send("Bitte wähle hier aus, was auf dich zutrifft.\n"
-                                 "Ignorier diese Nachricht, wenn du dies bereits auf dem Server gemacht hast :)",
-                                 view=OnboardingButtons(self.bot))
+    async def cog_unload(self):
+        self.refresh_scheduler.stop()
+
+    async def replay_pending(self):
+        """!
+        Apply actions that were left over by the last shutdown
+        A shutdown during the replay stops it, the remaining actions are persisted again
+        """
+        lifecycle = self.bot.lifecycle
+        actions = lifecycle.load_pending()
+        if actions:
+            logger.info(f"Replaying {len(actions)} actions left over by the last shutdown")
+
+        while actions and lifecycle.accepting:
+            # taken out of the list before it's tracked as in-flight, so that it isn't persisted twice
+            action = actions.pop(0)
+            member = self.guild.get_member(action["member_id"])
+            if member is None:
+                continue
+
+            try:
+                if action["kind"] == "commit":
+                    with lifecycle.track(**action):
+                        await member.add_roles(*(discord.Object(role) for role in action["give"]),
+                                               reason=action["reason"])
+                        await member.remove_roles(*(discord.Object(role) for role in action["remove"]),
+                                                  reason=action["reason"])
+
+                # the last run may have onboarded the member already or the member finished in the meantime
+                # onboard_member() tracks the action itself
+                elif action["kind"] == "onboard" and needs_onboarding(member):
+                    await self.onboard_member(member)
+
+                # other kinds like "bulk" are resumed by their own checkpoints
+
+            except discord.HTTPException as e:
+                logger.warning(f"Can't replay {action}: {e.__repr__()}")
+
+        if lifecycle.accepting:
+            lifecycle.finish_replay()
+
+    async def onboard_member(self, member: discord.Member) -> bool:
+        """!
+        Greet the member with the selection buttons and set member in onboarding mode
+        Members that were onboarded recently or are onboarded at the moment are skipped
+
+        @return True if the member was onboarded by this call
+        """
+        async with self.bot.ledger.claim(member.id, "onboard") as claimed:
+            if not claimed:
+                logger.info(f"Onboarding of {member.id} was already handled, skipping")
+                return False
+
+            with self.bot.lifecycle.track("onboard", member_id=member.id):
+                # set member in onboarding mode
+                # allow only to see the onboarding channel where users are confronted with buttons
+                await member.add_roles(self.onboarding_role)
+
+                # one message containing greeting and selection buttons
+                # members with closed DMs can still use the button in the onboarding channel
+                try:
+                    await self.send_onboarding_message(member, welcome=True)
+                except discord.Forbidden:
+                    logger.info(f"Can't send onboarding message to {member.id}, DMs are closed")
+                    self.onboarding_messages[member.id] += 1  # the member check shall not try again
+
+        return True
+
+    async def send_onboarding_message(self, member: discord.Member, welcome=False) -> discord.Message:
+        """!
+        Send the selection buttons and schedule a refresh for when they expire
+        The buttons expire after ONBOARDING_REFRESH hours without being used, which frees their view.
+        They're refreshed at most ONBOARDING_REFRESH_LIMIT times per run,
+        afterwards the member can still use the button in the onboarding channel
+
+        @param member member to send the buttons to
+        @param welcome greet the member in the same message
+        """
+        content = self.bot.templates.render("welcome_onboarding" if welcome else "onboarding",
+                                            str(self.guild.preferred_locale),
+                                            member=member.display_name, guild=self.guild.name)
+        view = OnboardingButtons(self.bot, timeout=ONBOARDING_REFRESH * 3600)
+        message = await member.send(content, view=view)
+        self.onboarding_messages[member.id] += 1
+        if self.onboarding_messages[member.id] <= ONBOARDING_REFRESH_LIMIT:
+            self.onboarding_views[member.id] = view
+            self.refresh_scheduler.schedule(member.id, time.time() + view.timeout + REFRESH_GRACE)
+        return message
+
+    async def refresh_onboarding(self, member_id: int):
+        """ Called by the scheduler when an onboarding message expired, sends a new one if still needed """
+        # using the buttons restarts their timeout, check again once the new timeout may have passed
+        view = self.onboarding_views.get(member_id)
+        if view is not None and not view.is_finished():
+            self.refresh_scheduler.schedule(member_id, time.time() + view.timeout + REFRESH_GRACE)
+            return
+
+        self.onboarding_views.pop(member_id, None)
+        member = self.guild.get_member(member_id)
+        if member is None or self.onboarding_role not in member.roles or not self.bot.lifecycle.accepting:
+            return
+
+        logger.info(f"Sent new interaction message to {member.id}")
+        await self.send_onboarding_message(member)
 
     @app_commands.command(name="update_base_roles", description="Update your base roles")
     # @app_commands.guild_only
@@ -46,8 +174,7 @@ class VerificationListener(commands.Cog):
                                 interaction: discord.Interaction,
                                 mode: Optional[Literal["silent", "loud"]] = "silent"):
         await interaction.response.send_message(
-            "Bitte wähle hier aus, was auf dich zutrifft.\n"
-            "Ignorier diese Nachricht, wenn du dies bereits auf dem Server gemacht hast :)",
+            self.bot.templates.render("onboarding", str(interaction.locale)),
             view=OnboardingButtons(self.bot),
             ephemeral=mode == "silent"
         )
@@ -61,71 +188,142 @@ class VerificationListener(commands.Cog):
             return
 
         if before_member.pending and not after_member.pending:
-            # TODO: maybe merge these two messages together to save api calls and make bot less annoying?
-            #  thing why it's two messages:
-            #  the first one is personalized the second one is generic and sent to the server too
-            await after_member.send(self.get_welcome_text(after_member))
+            # bot is shutting down, member will be onboarded on the next start
+            if not self.bot.lifecycle.accepting:
+                self.bot.lifecycle.defer("onboard", member_id=after_member.id)
+                return
 
-            # send message containing the selection buttons - this is a new message on purpose
-            # we can edit this message without losing the greeting text
-            await self.send_onboarding_message(after_member)
+            await self.onboard_member(after_member)
 
-            # set member in onboarding mode
-            # allow only to see the onboarding channel where users are confronted with buttons
-            await after_member.add_roles(self.onboarding_role)
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """ Forget that the member was onboarded, a member joining again shall be greeted again """
+        if member.guild.id != GUILD:
+            return
+
+        self.bot.ledger.forget(member.id, "onboard")
+        self.refresh_scheduler.cancel(member.id)
+        self.onboarding_views.pop(member.id, None)
+        self.onboarding_messages.pop(member.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.bot.resolver.invalidate_role(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.bot.resolver.invalidate_role(role.id)
+        if self.bot.resolver.is_configured_role(role.id):
+            logger.error(f"Configured role '{role.name}' ({role.id}) was deleted - please update the configuration")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        self.bot.resolver.invalidate_channel(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.bot.resolver.invalidate_channel(channel.id)
+        if self.bot.resolver.is_configured_channel(channel.id):
+            logger.error(f"Configured channel '{channel.name}' ({channel.id}) was deleted "
+                         f"- please update the configuration")
+
+    @commands.Cog.listener()
+    async def on_selection_committed(self, member: discord.Member):
+        """ Member answered the onboarding message, it doesn't need a refresh anymore """
+        self.refresh_scheduler.cancel(member.id)
+        self.onboarding_views.pop(member.id, None)
+        self.onboarding_messages.pop(member.id, None)
+
+    def plan_sweep(self, members: Iterable[discord.Member], not_before: datetime = NOT_BEFORE) -> SweepPlan:
+        """ Plan the member check with the current state of sent onboarding messages and ledger """
+        return plan_sweep(members, ONBOARDING_ROLE, not_before, self.onboarding_messages,
+                          lambda member_id: self.bot.ledger.is_handled(member_id, "onboard"))
+
+    async def execute_plan(self, plan: SweepPlan) -> Counter:
+        """!
+        Apply a plan in batches, waits after each batch to keep to SWEEP_API_RATE
+        Executing can take minutes, so every action is checked against the current state of the member first
+
+        @param plan plan to apply
+        @return amount of executed actions per kind
+        """
+        done = Counter()
+        for batch in plan.batches(SWEEP_BATCH_SIZE):
+            started = time.monotonic()
+            for action in batch:
+                # stop on shutdown, the next sweep picks up the remaining members
+                if not self.bot.lifecycle.accepting:
+                    logger.info("Stopping member check due to shutdown")
+                    return done
+
+                # member may have left, committed the selection or got a message since the plan was made
+                member = self.guild.get_member(action.member_id)
+                if member is None:
+                    continue
+
+                try:
+                    if action.kind == "onboard" and needs_onboarding(member) and await self.onboard_member(member):
+                        done[action.kind] += 1
+
+                    elif (action.kind == "refresh" and has_onboarding_role(member, ONBOARDING_ROLE)
+                          and member.id not in self.onboarding_messages):
+                        try:
+                            await self.send_onboarding_message(member)
+                        except discord.Forbidden:
+                            # DMs are closed, don't try again on every check
+                            self.onboarding_messages[member.id] += 1
+                            raise
+                        done[action.kind] += 1
+
+                except discord.HTTPException as e:
+                    logger.warning(f"Member check action {action.kind} failed for {member.id}: {e.__repr__()}")
+
+            wait = sum(action.calls for action in batch) / SWEEP_API_RATE - (time.monotonic() - started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        return done
 
     @tasks.loop(minutes=CHECK_PERIOD)
     async def walk_members(self):
         """ Walk all members every n minutes to fix errors that may occur due to downtimes or other errors """
         logger.info("Executing member check")
-        i = 0
-        j = 0
-        async for member in self.guild.fetch_members():
-            # check amount of roles,
-            # if member is not pending
-            # if he joined after a specific date to not verify old members
-            if len(member.roles) == 1 and not member.pending and member.joined_at.replace(tzinfo=None) > NOT_BEFORE:
-                # set user in onboarding mode
-                await member.add_roles(self.onboarding_role)
-                # TODO: if done above simplify message here too
-                # also send welcome and
-                await member.send(self.get_welcome_text(member))
-                # also sending the buttons
-                await self.send_onboarding_message(member)
-                i += 1
-
-            # member has onboarding and interaction is timed out
-            if self.onboarding_role in member.roles:
-                private_chat = member.dm_channel
-                # no private chat yet, let's send the message
-                if private_chat is None:
-                    await self.send_onboarding_message(member)
-                    continue
+        started = time.monotonic()
 
-                # check if latest interaction is time out
-                async for message in private_chat.history(limit=20):
-                    # walk chat until we hit an interaction
-                    interaction = message.interaction
-                    if interaction:
-                        # if this interaction is expired we send a new one
-                        if interaction.is_expired():
-                            logger.info(f"Sent new interaction message to {member.id}")
-                            await self.send_onboarding_message(member)
-                            j += 1
-                        # we're done with that user as soon as we hit one interaction
-                        break
+        # planned from the member cache like the dry-run, the members intent keeps it up to date
+        plan = self.plan_sweep(self.guild.members)
+        if plan.actions:
+            logger.info(plan.summary(SWEEP_API_RATE))
+
+        done = await self.execute_plan(plan)
+        if done["onboard"] > 0:
+            logger.info(f"Verified {done['onboard']} member that accepted the rules but didn't get the roles")
+
+        if done["refresh"] > 0:
+            logger.info(f"Sent {done['refresh']} members new interaction message")
 
-        if i > 0:
-            logger.info(f"Verified {i} member that accepted the rules but didn't get the roles")
+        self.last_walk_duration = time.monotonic() - started
 
-        if j > 0:
-            logger.info(f"Sent {j} members new interaction message")
+    @commands.command(name="sweep_plan", help="Show what the member check would do, optionally for another NOT_BEFORE")
+    @commands.check(ut.is_bot_owner)
+    async def sweep_plan(self, ctx: commands.Context, not_before: Optional[str] = None):
+        """!
+        Dry-run of the member check, plans with the member cache and doesn't touch discord
+
+        @param ctx Context of the message
+        @param not_before date like 25.08.2021 to preview instead of the configured NOT_BEFORE
+        """
+        try:
+            not_before_date = datetime.strptime(not_before, "%d.%m.%Y") if not_before else NOT_BEFORE
+        except ValueError:
+            await ctx.send(f"Can't read date '{not_before}', expected format: 25.08.2021")
+            return
 
-    def get_welcome_text(self, member: discord.Member):
-        return (f"Hey {member.display_name}, willkommen auf dem _{self.guild.name}_ Discord!\n"
-                f"\n"
-                "Bei Fragen kannst du dich jederzeit an uns wenden.\n"
-                "~Die Serverleitung")
+        plan = self.plan_sweep(self.guild.members, not_before_date)
+        preview = ", ".join(f"{action.kind} {action.member_id}" for action in plan.actions[:10])
+        await ctx.send(f"Dry-run with NOT_BEFORE={not_before_date.strftime('%d.%m.%Y')}\n"
+                       f"{plan.summary(SWEEP_API_RATE)}\n"
+                       f"{preview}{' ...' if len(plan.actions) > 10 else ''}")
 
 
 async def setup(bot: commands.Bot):
@@ -109,6 +109,24 @@ ONBOARDING_ROLE = int(load_env("ONBOARDING_ROLE", "1015975563250372698"))  # mem
 _NOT_BEFORE = load_env("NOT_BEFORE", "25.08.2021")
 NOT_BEFORE = datetime.strptime(_NOT_BEFORE, "%d.%m.%Y")
 CHECK_PERIOD = int(load_env("CHECK_PERIOD", "5"))
+BULK_JOB_FILE = load_env("BULK_JOB_FILE", "data/bulk_job.json")  # checkpoint of the running bulk job
+BULK_CHUNK_SIZE = int(load_env("BULK_CHUNK_SIZE", "25"))  # members processed between two checkpoints
+BULK_CHUNK_DELAY = float(load_env("BULK_CHUNK_DELAY", "10"))  # seconds to wait between two chunks
+PENDING_ACTIONS_FILE = load_env("PENDING_ACTIONS_FILE", "data/pending_actions.json")  # actions left at shutdown
+SHUTDOWN_DRAIN_TIMEOUT = float(load_env("SHUTDOWN_DRAIN_TIMEOUT", "8"))  # seconds to wait for in-flight actions
+LOOP_LAG_INTERVAL = float(load_env("LOOP_LAG_INTERVAL", "0.5"))  # seconds between two event loop lag measurements
+LOOP_LAG_THRESHOLD = float(load_env("LOOP_LAG_THRESHOLD", "0.25"))  # lag in seconds that logs the blocking code
+SWEEP_API_RATE = float(load_env("SWEEP_API_RATE", "5"))  # API calls per second the member check keeps to
+SWEEP_BATCH_SIZE = int(load_env("SWEEP_BATCH_SIZE", "10"))  # actions the member check applies between two pauses
+ONBOARDING_REFRESH = float(load_env("ONBOARDING_REFRESH", "24"))  # hours unused onboarding buttons work
+ONBOARDING_REFRESH_LIMIT = int(load_env("ONBOARDING_REFRESH_LIMIT", "3"))  # times an unanswered onboarding is re-sent
+TEMPLATE_FILE = load_env("TEMPLATE_FILE", "data/templates.json")  # optional, overwrites message templates per locale
+DEFAULT_LOCALE = load_env("DEFAULT_LOCALE", "de")  # templates used if there are none for the guild's locale
+EXPORT_DIR = load_env("EXPORT_DIR", "data/exports")  # member exports are written here
+EXPORT_CHUNK_SIZE = int(load_env("EXPORT_CHUNK_SIZE", "1000"))  # members written to the export file at once
+COMMIT_COALESCE_DELAY = float(load_env("COMMIT_COALESCE_DELAY", "1"))  # seconds a commit waits for further clicks
+LEDGER_TTL = float(load_env("LEDGER_TTL", "600"))  # seconds a member is remembered as onboarded
+RUNTIME_PROFILE = load_env("RUNTIME_PROFILE", "default")  # 'performance' uses uvloop and orjson if installed
 
 # rough sanity check if roles were given
 if not _ROLES:
@@ -1,4 +1,8 @@
 #!/bin/env python
+import asyncio
+import signal
+import time
+from typing import Optional
 
 import discord
 from discord.ext import commands
@@ -6,7 +10,14 @@ from discord.ext import commands
 # setup of logging and env-vars
 # logging must be initialized before environment, to enable logging in environment
 from .log_setup import logger, formatter, console_logger
-from .environment import PREFIX, TOKEN, ACTIVITY_NAME
+from .environment import PREFIX, TOKEN, ACTIVITY_NAME, SHUTDOWN_DRAIN_TIMEOUT
+from .utils import runtime
+from .utils.commits import CommitCoalescer
+from .utils.ledger import MemberLedger
+from .utils.lifecycle import Lifecycle
+from .utils.resolver import GuildResolver
+from .utils.templates import MessageTemplates
+from .utils.watchdog import LoopWatchdog
 
 """
 This bot is based on a template by nonchris
@@ -29,6 +40,53 @@ class MyBot(commands.Bot):
     def __init__(self, intents: discord.Intents = discord.Intents.all()):
         """ Initialize bot with intents and init super """
         super().__init__(command_prefix=self._prefix_callable, intents=intents)
+        self.lifecycle = Lifecycle()
+        self.ledger = MemberLedger()  # shared by all paths that onboard members
+        self.commits = CommitCoalescer()  # serializes role commits per member
+        # both read json files, so they're created in setup_hook() after start_bot() applied the runtime profile
+        self.templates: Optional[MessageTemplates] = None
+        self.resolver: Optional[GuildResolver] = None  # roles and channels of the configured guild
+        self.watchdog = LoopWatchdog()
+        self.started_at = time.perf_counter()  # reset by start_bot(), used to measure startup-to-ready
+        self._shutdown_task: Optional[asyncio.Task] = None  # graceful shutdown started by a signal
+
+    async def setup_hook(self):
+        """!
+        Read templates and role options, start measuring the event loop lag.
+        Register signal handlers, so that SIGTERM (e.g. docker stop) and SIGINT shut the bot down gracefully
+        """
+        self.templates = MessageTemplates()
+        self.resolver = GuildResolver(self)
+        self.watchdog.start()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._on_shutdown_signal)
+            # not supported on windows, the bot is just killed there
+            except NotImplementedError:
+                pass
+
+    def _on_shutdown_signal(self):
+        """ Start the graceful shutdown, further signals are ignored while it runs """
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.create_task(self.close())
+
+    async def close(self):
+        """!
+        Stop accepting new work, give in-flight actions some time to finish and save what's left.
+        Closes the connection afterwards. A second call during the drain closes immediately.
+        """
+        if self.lifecycle.accepting:
+            logger.info(f"Shutting down, waiting up to {SHUTDOWN_DRAIN_TIMEOUT}s for "
+                        f"{len(self.lifecycle.in_flight)} in-flight actions")
+            # commits submitted before the shutdown are applied while draining, new ones are deferred
+            if not await self.lifecycle.drain(SHUTDOWN_DRAIN_TIMEOUT, self.commits):
+                logger.warning(f"{len(self.lifecycle.in_flight)} actions didn't finish in time")
+            self.lifecycle.persist()
+
+        self.watchdog.stop()
+        await super().close()
 
     # login message
     async def on_ready(self):
@@ -43,7 +101,10 @@ class MyBot(commands.Bot):
         initial_extensions = [
             '.cogs.misc',
             '.cogs.help',
-            '.cogs.verification_listener'
+            '.cogs.verification_listener',
+            '.cogs.bulk_jobs',
+            '.cogs.export',
+            '.cogs.diagnostics'
         ]
 
         for extension in initial_extensions:
@@ -63,6 +124,7 @@ class MyBot(commands.Bot):
 
         logger.info(f"\n---\n"
                     f"Bot '{bot.user.name}' has connected, active on {len(self.guilds)} guilds:\n{guild_string}"
+                    f"Ready after {round(time.perf_counter() - self.started_at, 2)}s\n"
                     f"---\n")
 
         # set the status of the bot
@@ -122,6 +184,11 @@ bot = MyBot()
 def start_bot(token=None, log_handler=console_logger, log_formatter=formatter, root_logger=False):
     """ Start the bot, takes token, uses token from env if none is given """
     # TODO: Logs from d.py don't appear in the log file (note for the dev, not the template user)
+    # must happen before bot.run() creates the event loop
+    profile = runtime.apply_profile()
+    logger.info("Runtime: " + ", ".join(f"{k}: {v}" for k, v in profile.items()))
+    bot.started_at = time.perf_counter()
+
     if token is not None:
         bot.run(token, log_handler=log_handler, log_formatter=log_formatter, root_logger=root_logger)
     if TOKEN is not None:
@@ -0,0 +1,93 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from ..environment import COMMIT_COALESCE_DELAY
+
+### @package commits
+#
+# Per member serialization and coalescing of commits.
+# A member can commit several times in a short time, e.g. from the DM and from the server.
+# Commits of one member are applied one after another, a newer commit replaces a queued older one
+# and a commit equal to the one in-flight just waits for its result.
+#
+
+
+class _Slot:
+    """ State of one member: the commit in-flight and the newest commit waiting behind it """
+
+    def __init__(self):
+        self.running_selection: Optional[Hashable] = None
+        self.running_future: Optional[asyncio.Future] = None
+        self.pending: Optional[tuple[Hashable, Callable[[Any], Awaitable[Any]]]] = None
+        self.pending_future: Optional[asyncio.Future] = None
+        self.worker: Optional[asyncio.Task] = None
+
+
+class CommitCoalescer:
+    """
+    Applies the commits of each member one after another, so that the last submitted selection wins
+    """
+
+    def __init__(self, delay: float = COMMIT_COALESCE_DELAY):
+        """!
+        @param delay seconds a commit waits before it's applied, so that a burst of clicks ends in one commit
+        """
+        self.delay = delay
+        self._slots: dict[int, _Slot] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    async def submit(self, key: int, selection: Hashable, apply: Callable[[Any], Awaitable[Any]]) -> Any:
+        """!
+        Submit a commit and wait until the commit or a newer one replacing it was applied
+
+        @param key e.g. the member id
+        @param selection hashable description of the target state, equal selections are applied once
+        @param apply coroutine function called with the selection
+        @return result of the apply call that covered this commit
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+
+        # same commit is in-flight and nothing newer is queued - share its result
+        if slot.pending_future is None and slot.running_future is not None and selection == slot.running_selection:
+            return await asyncio.shield(slot.running_future)
+
+        # replace the queued commit, its callers get the result of this one
+        if slot.pending_future is None:
+            slot.pending_future = asyncio.get_running_loop().create_future()
+        slot.pending = (selection, apply)
+        future = slot.pending_future
+
+        if slot.worker is None:
+            slot.worker = asyncio.create_task(self._work(key, slot))
+
+        return await asyncio.shield(future)
+
+    async def _work(self, key: int, slot: _Slot):
+        """ Apply queued commits of one member until there are no more """
+        try:
+            while slot.pending_future is not None:
+                # give the burst some time to settle, later clicks replace the queued selection
+                await asyncio.sleep(self.delay)
+
+                (selection, apply), future = slot.pending, slot.pending_future
+                slot.pending = slot.pending_future = None
+                slot.running_selection, slot.running_future = selection, future
+
+                try:
+                    result = await apply(selection)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                slot.running_selection = slot.running_future = None
+
+        finally:
+            # futures are only left if the worker was cancelled, e.g. on shutdown
+            for future in (slot.pending_future, slot.running_future):
+                if future is not None and not future.done():
+                    future.cancel()
+            del self._slots[key]
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from ..environment import LEDGER_TTL
+
+### @package ledger
+#
+# Per member work ledger.
+# Event listeners and the periodic member check can decide to do the same work for a member at the same time.
+# The ledger serializes this work per member and remembers for a while that it was done, so it's done only once.
+#
+
+
+class MemberLedger:
+    """
+    Per member locks and short-lived 'already handled' entries
+    """
+
+    def __init__(self, ttl: float = LEDGER_TTL):
+        """!
+        @param ttl seconds a work is remembered as handled
+        """
+        self.ttl = ttl
+        self._locks: dict[tuple[int, str], asyncio.Lock] = {}
+        self._handled: dict[tuple[int, str], float] = {}  # maps (member id, work) to time the entry expires
+        self._next_prune = time.monotonic() + ttl
+
+    def is_handled(self, member_id: int, work: str) -> bool:
+        """ Check whether the work was done for that member recently """
+        expires = self._handled.get((member_id, work))
+        return expires is not None and expires > time.monotonic()
+
+    def forget(self, member_id: int, work: str):
+        """ Remove the entry, so that the work can be done again e.g. if the member re-joins """
+        self._handled.pop((member_id, work), None)
+
+    @asynccontextmanager
+    async def claim(self, member_id: int, work: str):
+        """!
+        Wait until no one else does that work for the member and check whether it was handled in the meantime.
+        The work is marked as handled if the with-block finishes without an exception.
+
+        async with ledger.claim(member.id, "onboard") as claimed:
+            if not claimed:
+                return
+
+        @param member_id member the work is done for
+        @param work name of the work
+        @return True if the caller shall do the work
+        """
+        self._prune()
+        key = (member_id, work)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            if self.is_handled(member_id, work):
+                yield False
+                return
+
+            yield True
+            self._handled[key] = time.monotonic() + self.ttl
+
+    def _prune(self):
+        """ Drop expired entries and locks no one holds from time to time, so that the ledger doesn't grow """
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+
+        self._next_prune = now + self.ttl
+        self._handled = {key: expires for key, expires in self._handled.items() if expires > now}
+        # waiters only exist while a lock is held, so unlocked locks can be dropped safely
+        self._locks = {key: lock for key, lock in self._locks.items() if lock.locked()}
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from ..environment import PENDING_ACTIONS_FILE
+from ..log_setup import logger
+from . import runtime
+
+### @package lifecycle
+#
+# Book keeping for a graceful shutdown.
+# Work that touches discord is tracked while it runs, so that a shutdown can wait for it.
+# Actions that couldn't be done before the bot stopped are written to disk and replayed on the next start.
+#
+
+
+class Lifecycle:
+    """
+    Tracks in-flight actions and collects the ones that have to wait for the next start
+    """
+
+    def __init__(self, pending_file=PENDING_ACTIONS_FILE):
+        self.pending_file = pending_file
+        self.accepting = True  # False as soon as the shutdown started
+        self.in_flight: list[dict] = []
+        self.pending: list[dict] = []
+        self.replaying: list[dict] = []  # actions of the last shutdown that weren't replayed yet
+        self._loaded = False
+
+    @contextmanager
+    def track(self, kind: str, **params):
+        """!
+        Mark an action as in-flight while the with-block runs
+
+        @param kind type of the action, used to replay it
+        @param params json serializable parameters needed to replay the action
+        """
+        action = {"kind": kind, **params}
+        self.in_flight.append(action)
+        try:
+            yield action
+        finally:
+            self.in_flight.remove(action)
+
+    def defer(self, kind: str, **params):
+        """ Store an action that shall be done on the next start """
+        self.pending.append({"kind": kind, **params})
+
+    async def drain(self, timeout: float, *queues) -> bool:
+        """!
+        Stop accepting new work and wait until in-flight actions are done
+
+        @param timeout maximum seconds to wait
+        @param queues sized objects holding work that isn't in-flight yet, waited for until they're empty
+        @return True if all actions finished in time
+        """
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        while (self.in_flight or any(queues)) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        return not self.in_flight and not any(queues)
+
+    def persist(self):
+        """ Write deferred, in-flight and not yet replayed actions to disk, replacing the file of the last shutdown """
+        # stopped before the replay started, the actions of the last shutdown must not be overwritten
+        if not self._loaded:
+            self.load_pending()
+
+        actions = self.replaying + self.pending + self.in_flight
+        if not actions:
+            self.finish_replay()
+            return
+
+        # write to a temporary file first, so that a kill can't leave a half written file
+        tmp_path = f"{self.pending_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(actions, f)
+        os.replace(tmp_path, self.pending_file)
+        logger.info(f"Saved {len(actions)} pending actions to '{self.pending_file}'")
+
+    def load_pending(self) -> list[dict]:
+        """!
+        Read actions saved by the last shutdown
+        The file is kept until finish_replay(), actions still in the returned list are persisted again on shutdown
+
+        @return list of actions to replay, take them out one by one while replaying
+        """
+        self._loaded = True
+        if not os.path.isfile(self.pending_file):
+            return self.replaying
+
+        try:
+            self.replaying = runtime.load_json(self.pending_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Can't read pending actions from '{self.pending_file}': {e.__repr__()}")
+
+        return self.replaying
+
+    def finish_replay(self):
+        """ Remove the file of the last shutdown, so that its actions are only replayed once """
+        if os.path.isfile(self.pending_file):
+            os.remove(self.pending_file)
@@ -0,0 +1,105 @@
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Container, Iterable, Iterator, NamedTuple
+
+import discord
+
+### @package reconcile
+#
+# Planning stage of the member check.
+# plan_sweep() only looks at member objects and decides what has to be done, it doesn't talk to discord.
+# The resulting plan can be printed as a dry-run or applied by the executor of the VerificationListener.
+#
+
+# API calls an action needs, a missing DM channel costs one more call to open it
+API_CALLS = {
+    "onboard": 2,  # send welcome with buttons, add onboarding role
+    "refresh": 1,  # send new buttons
+}
+
+
+class Action(NamedTuple):
+    """ Something the member check has to do for a member """
+    kind: str
+    member_id: int
+    calls: int  # estimated API calls
+
+
+class SweepPlan:
+    """
+    Actions decided by the planning stage, including an estimation of API calls and duration
+    """
+
+    def __init__(self, actions: list[Action], members: int):
+        self.actions = actions
+        self.members = members  # amount of members that were checked
+
+    @property
+    def estimated_calls(self) -> int:
+        return sum(action.calls for action in self.actions)
+
+    def estimated_duration(self, rate: float) -> float:
+        """ Seconds the plan takes when the executor keeps to rate API calls per second """
+        return self.estimated_calls / rate
+
+    def batches(self, size: int) -> Iterator[list[Action]]:
+        for i in range(0, len(self.actions), size):
+            yield self.actions[i:i + size]
+
+    def summary(self, rate: float) -> str:
+        counts = Counter(action.kind for action in self.actions)
+        kinds = ", ".join(f"{count} {kind}" for kind, count in counts.items()) or "nothing to do"
+        return (f"Checked {self.members} members: {kinds}\n"
+                f"Estimated {self.estimated_calls} API calls, ~{round(self.estimated_duration(rate))}s "
+                f"at {rate} calls/s")
+
+
+def needs_onboarding(member: discord.Member) -> bool:
+    """ Member accepted the rules but has no roles besides @everyone yet """
+    return len(member.roles) == 1 and not member.pending
+
+
+def has_onboarding_role(member: discord.Member, onboarding_role_id: int) -> bool:
+    return any(role.id == onboarding_role_id for role in member.roles)
+
+
+def plan_sweep(members: Iterable[discord.Member],
+               onboarding_role_id: int,
+               not_before: datetime,
+               messaged: Container[int],
+               recently_onboarded: Callable[[int], bool]) -> SweepPlan:
+    """!
+    Decide what the member check has to do, without any side effects
+
+    @param members members to check
+    @param onboarding_role_id role members only have during onboarding
+    @param not_before members that joined before aren't onboarded
+    @param messaged ids of members that got an onboarding message from this run
+    @param recently_onboarded tells whether a member was onboarded recently
+    @return plan containing the actions in the order of the members
+    """
+    actions = []
+    checked = 0
+    for member in members:
+        checked += 1
+        dm_call = 1 if member.dm_channel is None else 0
+
+        # check amount of roles,
+        # if member is not pending
+        # if he joined after a specific date to not verify old members
+        if needs_onboarding(member) and member.joined_at.replace(tzinfo=None) > not_before:
+            if not recently_onboarded(member.id):
+                actions.append(Action("onboard", member.id, API_CALLS["onboard"] + dm_call))
+            continue
+
+        # member just got the onboarding view, no need to check for a timed out one
+        if recently_onboarded(member.id):
+            continue
+
+        # member has onboarding but didn't get a message from this run
+        # this happens after a restart - the buttons sent by the last run don't work anymore
+        # messages sent by this run are refreshed by the scheduler, up to ONBOARDING_REFRESH_LIMIT times
+        if member.id not in messaged and has_onboarding_role(member, onboarding_role_id):
+            actions.append(Action("refresh", member.id, API_CALLS["refresh"] + dm_call))
+
+    return SweepPlan(actions, checked)
@@ -0,0 +1,111 @@
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from ..environment import GUILD, ROLES, ONBOARDING_ROLE, START_CHANNEL, ONBOARDING_CHANNEL, ROLE_OPTION_FILE
+from ..log_setup import logger
+from . import runtime
+
+### @package resolver
+#
+# Cache resolving the configured role and channel ids of the guild to their objects.
+# Entries are invalidated by the role and channel events (see VerificationListener),
+# so a deleted role shows up as missing instead of silently being used.
+#
+
+
+def load_role_options() -> dict[str, int]:
+    """!
+    Read the role options from ROLE_OPTION_FILE
+
+    @return mapping of button label to role id
+    """
+    button_option_dict: dict = runtime.load_json(ROLE_OPTION_FILE)
+    # we can assume that there is only one key since this bot is currently single server
+    guild_key = list(button_option_dict.keys())[0]  # TODO: come up with a better solution
+    return button_option_dict[guild_key]["role_buttons"]
+
+
+class GuildResolver:
+    """
+    Maps role and channel ids of the configured guild to objects, shared by views and cogs
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.role_options = load_role_options()  # button label to role id, read once
+        self._roles: dict[int, discord.Role] = {}
+        self._channels: dict[int, discord.abc.GuildChannel] = {}
+        # computed on first access, reset when a role is invalidated
+        self._option_roles: Optional[frozenset[discord.Role]] = None
+        self._default_roles: Optional[frozenset[discord.Role]] = None
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.bot.get_guild(GUILD)
+
+    def role(self, role_id: int) -> Optional[discord.Role]:
+        """ Resolve a role, None if the role doesn't exist """
+        role = self._roles.get(role_id)
+        if role is None:
+            role = self.guild.get_role(role_id)
+            if role is not None:
+                self._roles[role_id] = role
+        return role
+
+    def channel(self, channel_id: int) -> Optional[discord.abc.GuildChannel]:
+        """ Resolve a channel, None if the channel doesn't exist """
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.guild.get_channel(channel_id)
+            if channel is not None:
+                self._channels[channel_id] = channel
+        return channel
+
+    def resolve_roles(self, role_ids) -> frozenset[discord.Role]:
+        """ Resolve several roles, roles that don't exist are left out """
+        return frozenset(role for role in map(self.role, role_ids) if role is not None)
+
+    @property
+    def option_roles(self) -> frozenset[discord.Role]:
+        """ Roles that can be selected with the buttons """
+        if self._option_roles is None:
+            self._option_roles = self.resolve_roles(self.role_options.values())
+        return self._option_roles
+
+    @property
+    def default_roles(self) -> frozenset[discord.Role]:
+        """ Roles every member gets after the onboarding """
+        if self._default_roles is None:
+            self._default_roles = self.resolve_roles(ROLES)
+        return self._default_roles
+
+    def invalidate_role(self, role_id: int):
+        self._roles.pop(role_id, None)
+        self._option_roles = None
+        self._default_roles = None
+
+    def invalidate_channel(self, channel_id: int):
+        self._channels.pop(channel_id, None)
+
+    def is_configured_role(self, role_id: int) -> bool:
+        return role_id == ONBOARDING_ROLE or role_id in ROLES or role_id in self.role_options.values()
+
+    def is_configured_channel(self, channel_id: int) -> bool:
+        return channel_id in (START_CHANNEL, ONBOARDING_CHANNEL)
+
+    def verify(self) -> bool:
+        """!
+        Check that all configured roles and channels exist, logs an error for each one that doesn't
+
+        @return True if everything was found
+        """
+        missing = [f"role {role_id}" for role_id in [ONBOARDING_ROLE, *ROLES, *self.role_options.values()]
+                   if self.role(role_id) is None]
+        missing += [f"channel {channel_id}" for channel_id in (START_CHANNEL, ONBOARDING_CHANNEL)
+                    if self.channel(channel_id) is None]
+
+        for entry in missing:
+            logger.error(f"Configured {entry} doesn't exist on guild {GUILD}")
+        return not missing
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import discord.utils
+
+from ..environment import RUNTIME_PROFILE
+from ..log_setup import logger
+
+### @package runtime
+#
+# Runtime profiles.
+# The 'performance' profile uses uvloop and orjson if they're installed and falls back to asyncio and json if not.
+# discord.py itself uses orjson for gateway payloads as soon as it's installed
+# and requests zstd instead of zlib stream compression if zstandard is installed.
+#
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+PROFILES = ("default", "performance")
+
+# set by apply_profile(), decides which json library load_json() uses
+_use_orjson = False
+
+
+def apply_profile(profile: str = RUNTIME_PROFILE) -> dict[str, str]:
+    """!
+    Set up the runtime for a profile, must be called before the event loop is created
+
+    @param profile one of PROFILES, unknown profiles fall back to 'default'
+    @return mapping of component to the implementation that is used
+    """
+    global _use_orjson
+
+    if profile not in PROFILES:
+        logger.warning(f"Unknown RUNTIME_PROFILE '{profile}' - falling back to 'default'")
+        profile = "default"
+
+    performance = profile == "performance"
+    if performance and uvloop is None:
+        logger.warning("Profile 'performance': uvloop isn't installed - using asyncio event loop")
+    if performance and orjson is None:
+        logger.warning("Profile 'performance': orjson isn't installed - using json")
+
+    if performance and uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    _use_orjson = performance and orjson is not None
+
+    return {
+        "profile": profile,
+        "event loop": "uvloop" if performance and uvloop is not None else "asyncio",
+        "json": "orjson" if _use_orjson else "json",
+        # discord.py decides on its own, we can only report it
+        "gateway json": "orjson" if discord.utils.HAS_ORJSON else "json",
+        "gateway compression": getattr(getattr(discord.utils, "_ActiveDecompressionContext", None),
+                                       "COMPRESSION_TYPE", "zlib-stream"),
+    }
+
+
+def load_json(path: str):
+    """!
+    Read a json file using the library of the active profile
+
+    @param path file to read
+    @return parsed content
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    return orjson.loads(data) if _use_orjson else json.loads(data)
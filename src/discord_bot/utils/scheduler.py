@@ -0,0 +1,99 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Optional
+
+from ..log_setup import logger
+
+### @package scheduler
+#
+# Timer scheduler based on a heap.
+# Instead of polling all entries for expiry, a single task sleeps until the earliest deadline.
+#
+
+
+class DeadlineScheduler:
+    """
+    Calls a callback with a key as soon as the deadline of that key is reached
+    """
+
+    def __init__(self, callback: Callable[[int], Awaitable[None]]):
+        """!
+        @param callback coroutine function called with the key of an expired deadline
+        """
+        self.callback = callback
+        self._heap: list[tuple[float, int]] = []  # (deadline, key), may contain outdated entries
+        self._deadlines: dict[int, float] = {}  # current deadline of each key, decides whether a heap entry is valid
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def next_deadline(self) -> Optional[float]:
+        """ Earliest deadline as unix timestamp, None if nothing is scheduled """
+        return min(self._deadlines.values(), default=None)
+
+    def schedule(self, key: int, deadline: float):
+        """!
+        Schedule a key, an existing deadline of that key is replaced
+
+        @param key key passed to the callback, e.g. a member id
+        @param deadline unix timestamp
+        """
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+
+        # replaced and cancelled deadlines stay in the heap until they're popped, rebuild when they pile up
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, k) for k, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+        # the new deadline might be earlier than the one the task sleeps for
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, key: int):
+        """ Remove the deadline of a key, unknown keys are ignored """
+        self._deadlines.pop(key, None)
+
+    def start(self):
+        """ Start the task, must be called from within the running loop """
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def _pop_outdated(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._pop_outdated()
+            self._wakeup.clear()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                # sleep until the deadline or until a new deadline is scheduled
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            try:
+                await self.callback(key)
+            except Exception as e:
+                logger.error(f"Scheduled callback for {key} failed: {e.__repr__()}")
@@ -0,0 +1,103 @@
+import os
+from string import Template
+
+from ..environment import TEMPLATE_FILE, DEFAULT_LOCALE, EXTRA_INFO, START_CHANNEL, ONBOARDING_CHANNEL
+from ..log_setup import logger
+from . import runtime
+
+### @package templates
+#
+# Message composition.
+# All texts the bot sends are templates that can be overwritten per locale with TEMPLATE_FILE.
+# Values that don't change at runtime are substituted once when the templates are compiled,
+# only member and guild name are substituted for each message.
+#
+
+# available placeholders: $member, $guild, $extra_info, $start_channel, $onboarding_channel
+DEFAULT_TEMPLATES = {
+    "de": {
+        # first message a new member gets, carries the selection buttons
+        "welcome_onboarding": "Hey $member, willkommen auf dem _${guild}_ Discord!\n"
+                              "\n"
+                              "Bitte wähle hier aus, was auf dich zutrifft.\n"
+                              "Ignorier diese Nachricht, wenn du dies bereits auf dem Server gemacht hast :)\n"
+                              "\n"
+                              "Bei Fragen kannst du dich jederzeit an uns wenden.\n"
+                              "~Die Serverleitung",
+        # selection buttons without greeting, e.g. refreshes and the update command
+        "onboarding": "Bitte wähle hier aus, was auf dich zutrifft.\n"
+                      "Ignorier diese Nachricht, wenn du dies bereits auf dem Server gemacht hast :)",
+        "entry_point": "Klick auf den Button und wähle die Optionen, die auf dich zutreffen.\n"
+                       "Bei Problemen wende dich bitte an die Serverleitung :)",
+        "onboarded": "Du bist nun freigeschaltet\n"
+                     "Schau doch mal in $start_channel vorbei :)\n"
+                     "$extra_info",
+        "roles_updated": "Deine Rollen wurden aktualisiert.\n"
+                         "Viel Spaß weiterhin!",
+        "restarting": "Der Bot startet gerade neu, deine Auswahl wird danach übernommen.",
+        "left": "Du bist nicht mehr auf dem Server.",
+    }
+}
+
+
+class MessageTemplates:
+    """
+    Precompiled message templates, cached per locale
+    """
+
+    def __init__(self, template_file: str = TEMPLATE_FILE, default_locale: str = DEFAULT_LOCALE):
+        """!
+        @param template_file optional json of the form {"<locale>": {"<template name>": "<text>"}}
+        @param default_locale locale used if there are no templates for the requested one
+        """
+        self.default_locale = default_locale
+        # substituted once at compile time, '$' is escaped so that it survives the second substitution
+        self.static_values = {
+            key: value.replace("$", "$$") for key, value in {
+                "extra_info": EXTRA_INFO,
+                "start_channel": f"<#{START_CHANNEL}>",
+                "onboarding_channel": f"<#{ONBOARDING_CHANNEL}>",
+            }.items()
+        }
+
+        texts = {locale: dict(templates) for locale, templates in DEFAULT_TEMPLATES.items()}
+        if os.path.isfile(template_file):
+            try:
+                for locale, templates in runtime.load_json(template_file).items():
+                    texts.setdefault(locale, {}).update(templates)
+            except (OSError, ValueError, AttributeError) as e:
+                logger.error(f"Can't read templates from '{template_file}': {e.__repr__()} - using defaults")
+
+        self._cache: dict[str, dict[str, Template]] = {
+            locale: {name: self.compile(text) for name, text in templates.items()}
+            for locale, templates in texts.items()
+        }
+
+        if self.default_locale not in self._cache:
+            logger.warning(f"No templates for DEFAULT_LOCALE '{self.default_locale}' - falling back to 'de'")
+            self.default_locale = "de"
+
+    def compile(self, text: str) -> Template:
+        return Template(Template(text).safe_substitute(self.static_values))
+
+    def get_template(self, name: str, locale: str = None) -> Template:
+        """!
+        Find a template, tries the exact locale, then the language only ('en-US' -> 'en'), then the default locale
+        """
+        for key in (locale, locale.split("-")[0] if locale else None):
+            if key in self._cache and name in self._cache[key]:
+                return self._cache[key][name]
+
+        return self._cache[self.default_locale].get(name) or self._cache["de"][name]
+
+    def render(self, name: str, locale: str = None, member: str = "", guild: str = "") -> str:
+        """!
+        Render a template
+
+        @param name name of the template
+        @param locale e.g. 'de' or 'en-US', default locale if None
+        @param member name of the member
+        @param guild name of the guild
+        @return text ready to send
+        """
+        return self.get_template(name, locale).safe_substitute(member=member, guild=guild)
@@ -3,6 +3,9 @@ from typing import Union
 
 import discord
 from discord.errors import Forbidden
+from discord.ext import commands
+
+from ..environment import OWNER_ID
 
 ### @package utils
 #
@@ -85,3 +88,14 @@ def get_member_name(member: discord.Member) -> str:
     @return member.nick if exists else member.name
     """
     return member.nick if member.nick else member.name
+
+
+async def is_bot_owner(ctx: commands.Context) -> bool:
+    """!
+    Check whether the author of a command is the configured owner or the owner of the application
+    Can be used as cog_check() to make a whole cog owner-only
+
+    @param ctx Context of the message
+    @return True if author is an owner
+    """
+    return ctx.author.id == OWNER_ID or await ctx.bot.is_owner(ctx.author)
@@ -0,0 +1,109 @@
+import asyncio
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from ..environment import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD
+from ..log_setup import logger
+
+### @package watchdog
+#
+# Continuous measurement of the event loop lag.
+# A task in the loop measures how late its sleeps wake up, a thread outside the loop notices when these
+# wake ups stop and logs the stack of the code that blocks the loop.
+#
+
+REPORT_PERIOD = 300  # seconds between two lag summaries in the log
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag and logs the stack of code that blocks the loop
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD,
+                 max_samples: int = 1000):
+        """!
+        @param interval seconds between two measurements
+        @param threshold lag in seconds after which the blocking code is logged
+        @param max_samples amount of recent measurements the percentiles are calculated from
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: deque[float] = deque(maxlen=max_samples)
+
+        self._heartbeat = time.monotonic()  # last time the loop woke up the measuring task
+        self._reported = False  # only log one stack per blocking
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """ Start measuring, must be called from within the running loop """
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _measure(self):
+        """ Sleep for a fixed interval, everything the wake up is late is lag """
+        last_report = time.monotonic()
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            self.samples.append(now - start - self.interval)
+            self._heartbeat = now
+            self._reported = False
+
+            if now - last_report > REPORT_PERIOD:
+                last_report = now
+                logger.info(f"Event loop lag: {self.format_percentiles()}")
+
+    def _watch(self):
+        """ Runs in an own thread, so that it's able to see the loop while the loop is blocked """
+        while not self._stop.wait(self.interval / 2):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold or self._reported:
+                continue
+
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "unknown"
+            logger.warning(f"Event loop blocked for at least {round(blocked * 1000)}ms, "
+                           f"stack of the blocking code:\n{stack}")
+
+    def percentiles(self, *percents: int) -> dict[int, float]:
+        """!
+        Calculate lag percentiles of the recent measurements using the nearest rank
+
+        @param percents percentiles to calculate, defaults to 50, 95 and 99
+        @return mapping of percentile to lag in seconds, empty if nothing was measured yet
+        """
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+
+        return {p: samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+                for p in (percents or (50, 95, 99))}
+
+    def format_percentiles(self) -> str:
+        """ Human readable percentiles and maximum of the lag """
+        percentiles = self.percentiles()
+        if not percentiles:
+            return "no measurements yet"
+
+        return ", ".join([f"p{p}: {round(lag * 1000, 1)}ms" for p, lag in percentiles.items()]
+                         + [f"max: {round(max(self.samples) * 1000, 1)}ms"])